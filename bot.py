@@ -29,17 +29,24 @@ Deploy
 from __future__ import annotations
 
 import asyncio
+import functools
 import os
+import re
 import sqlite3
-from contextlib import closing
+import threading
+from collections import OrderedDict
 from dataclasses import dataclass
-from datetime import datetime, date, timedelta
+from datetime import datetime, date
+from typing import Final
 from zoneinfo import ZoneInfo
 
 from aiogram import Bot, Dispatcher, F
+from aiogram.exceptions import TelegramRetryAfter
 from aiogram.filters import Command, CommandObject
 from aiogram.types import Message, CallbackQuery
 from aiogram.utils.keyboard import InlineKeyboardBuilder
+from apscheduler.executors.asyncio import AsyncIOExecutor
+from apscheduler.executors.pool import ThreadPoolExecutor
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 
@@ -53,15 +60,13 @@ if not BOT_TOKEN:
 
 bot = Bot(BOT_TOKEN)
 dp = Dispatcher()
-scheduler = AsyncIOScheduler()
+# coroutine jobs run on the event loop; plain sync DB jobs go to "blocking"
+scheduler = AsyncIOScheduler(
+    executors={"default": AsyncIOExecutor(), "blocking": ThreadPoolExecutor(8)},
+)
 
 # -------------- DATABASE --------------
 
-def db():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
-
 SCHEMA = """
 CREATE TABLE IF NOT EXISTS users (
   user_id INTEGER PRIMARY KEY,
@@ -72,7 +77,7 @@ CREATE TABLE IF NOT EXISTS tasks (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   user_id INTEGER NOT NULL,
   title TEXT NOT NULL,
-  day DATE NOT NULL,
+  day INTEGER NOT NULL,
   due_time TEXT,
   priority TEXT DEFAULT 'med',
   tags TEXT DEFAULT '',
@@ -83,15 +88,111 @@ CREATE TABLE IF NOT EXISTS tasks (
 CREATE TABLE IF NOT EXISTS sends (
   user_id INTEGER NOT NULL,
   kind TEXT NOT NULL,
-  day DATE NOT NULL,
+  day INTEGER NOT NULL,
   hour INTEGER NOT NULL,
   PRIMARY KEY(user_id, kind, day, hour)
 );
+
+CREATE INDEX IF NOT EXISTS idx_tasks_user_day_status ON tasks(user_id, day, status);
 """
 
-with closing(db()) as conn:
-    conn.executescript(SCHEMA)
-    conn.commit()
+# Statements are defined once here and shared by the call sites that run
+# them (e.g. SQL_INSERT_TASK by /add and /tomorrow, SQL_LIST_DAY by /list).
+SQL_SELECT_USER: Final[str] = "SELECT user_id, tz FROM users WHERE user_id=?"
+SQL_INSERT_USER: Final[str] = "INSERT INTO users(user_id, tz) VALUES (?, ?)"
+SQL_UPSERT_TZ: Final[str] = (
+    "INSERT INTO users(user_id, tz) VALUES(?, ?) "
+    "ON CONFLICT(user_id) DO UPDATE SET tz=excluded.tz"
+)
+SQL_SELECT_USERS: Final[str] = "SELECT user_id, tz FROM users"
+SQL_INSERT_TASK: Final[str] = (
+    "INSERT INTO tasks(user_id, title, day, due_time, priority, tags) VALUES (?,?,?,?,?,?)"
+)
+SQL_LIST_DAY: Final[str] = (
+    "SELECT * FROM tasks WHERE user_id=? AND day=? "
+    "ORDER BY priority_rank, COALESCE(due_time,'99:99')"
+)
+SQL_LIST_TWO_DAYS: Final[str] = (
+    "SELECT * FROM tasks WHERE user_id=? AND day IN (?, ?) "
+    "ORDER BY day, priority_rank, COALESCE(due_time,'99:99')"
+)
+SQL_MARK_DONE: Final[str] = "UPDATE tasks SET status='done' WHERE id=? RETURNING user_id, day"
+SQL_WEEK_STATS: Final[str] = (
+    "SELECT status, COUNT(*) c FROM tasks WHERE user_id=? AND day BETWEEN ? AND ? GROUP BY status"
+)
+SQL_CARRY_OVER: Final[str] = (
+    "INSERT INTO tasks(user_id, title, day, due_time, priority, tags) "
+    "SELECT user_id, title, ?, due_time, priority, tags FROM tasks "
+    "WHERE user_id=? AND day=? AND status='open'"
+)
+SQL_INSERT_SENDS: Final[str] = "INSERT OR IGNORE INTO sends(user_id, kind, day, hour) VALUES (?,?,?,?)"
+SQL_PRUNE_SENDS: Final[str] = (
+    "DELETE FROM sends WHERE day < CAST(julianday('now','-30 days') + 0.5 AS INTEGER)"
+)
+
+# One long-lived connection shared by every handler and scheduled job.
+# Autocommit mode (isolation_level=None); _db_lock serializes access.
+CONN = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None, cached_statements=256)
+CONN.row_factory = sqlite3.Row
+CONN.executescript(SCHEMA)
+CONN.executescript(
+    "PRAGMA journal_mode=WAL;"
+    "PRAGMA synchronous=NORMAL;"
+    "PRAGMA temp_store=MEMORY;"
+    "PRAGMA cache_size=-64000;"
+    "PRAGMA busy_timeout=2000;"
+    "PRAGMA mmap_size=134217728;"
+)
+# user_version 1: day used to be stored as 'YYYY-MM-DD' text; convert it once
+# to integer Julian day numbers (see day_num()). Rows whose text isn't a valid
+# date are left as-is and reported; they no longer match any query.
+if CONN.execute("PRAGMA user_version").fetchone()[0] < 1:
+    CONN.execute("BEGIN IMMEDIATE")
+    try:
+        for _table in ("tasks", "sends"):
+            CONN.execute(
+                f"UPDATE {_table} SET day = CAST(julianday(day) + 0.5 AS INTEGER) "
+                "WHERE typeof(day) = 'text' AND julianday(day) IS NOT NULL"
+            )
+            _bad = CONN.execute(f"SELECT COUNT(*) FROM {_table} WHERE typeof(day) = 'text'").fetchone()[0]
+            if _bad:
+                print(f"migration: left {_bad} {_table} row(s) with an unparseable day")
+        CONN.execute("PRAGMA user_version=1")
+    except Exception:
+        CONN.rollback()
+        raise
+    CONN.commit()
+# priority_rank lets /list and the digest sort straight off idx_tasks_order.
+# table_xinfo (not table_info) is needed to see generated columns.
+if "priority_rank" not in {r["name"] for r in CONN.execute("PRAGMA table_xinfo(tasks)")}:
+    CONN.execute(
+        "ALTER TABLE tasks ADD COLUMN priority_rank INTEGER GENERATED ALWAYS AS "
+        "(CASE priority WHEN 'high' THEN 0 WHEN 'med' THEN 1 ELSE 2 END) VIRTUAL"
+    )
+CONN.execute(
+    "CREATE INDEX IF NOT EXISTS idx_tasks_order "
+    "ON tasks(user_id, day, priority_rank, COALESCE(due_time,'99:99'))"
+)
+_db_lock = threading.Lock()
+
+
+def _query_sync(sql: str, params=()) -> list[sqlite3.Row]:
+    with _db_lock:
+        return CONN.execute(sql, params).fetchall()
+
+
+def _write_sync(sql: str, params=()) -> int:
+    with _db_lock:
+        return CONN.execute(sql, params).rowcount
+
+
+# sqlite3 calls block, so coroutines run them on worker threads via these.
+async def _exec(sql: str, params=()) -> list[sqlite3.Row]:
+    return await asyncio.to_thread(_query_sync, sql, params)
+
+
+async def _write(sql: str, params=()) -> int:
+    return await asyncio.to_thread(_write_sync, sql, params)
 
 # --------------- HELPERS --------------
 
@@ -101,41 +202,69 @@ class User:
     tz: str
 
 
-def get_user(user_id: int) -> User:
-    with closing(db()) as conn:
-        cur = conn.execute("SELECT user_id, tz FROM users WHERE user_id=?", (user_id,))
+def _get_or_create_user(user_id: int) -> User:
+    with _db_lock:
+        cur = CONN.execute(SQL_SELECT_USER, (user_id,))
         row = cur.fetchone()
         if row:
             return User(row["user_id"], row["tz"])
-        conn.execute("INSERT INTO users(user_id, tz) VALUES (?, ?)", (user_id, DEFAULT_TZ))
-        conn.commit()
+        CONN.execute(SQL_INSERT_USER, (user_id, DEFAULT_TZ))
         return User(user_id, DEFAULT_TZ)
 
 
-def set_tz(user_id: int, tz: str) -> None:
-    with closing(db()) as conn:
-        conn.execute(
-            "INSERT INTO users(user_id, tz) VALUES(?, ?) "
-            "ON CONFLICT(user_id) DO UPDATE SET tz=excluded.tz",
-            (user_id, tz),
-        )
-        conn.commit()
+async def get_user(user_id: int) -> User:
+    return await asyncio.to_thread(_get_or_create_user, user_id)
+
+
+async def set_tz(user_id: int, tz: str) -> None:
+    await _write(SQL_UPSERT_TZ, (user_id, tz))
+
+
+@functools.lru_cache(maxsize=512)
+def _zi(tz: str) -> ZoneInfo:
+    # Only fed timezones already validated by /tz (or DEFAULT_TZ).
+    return ZoneInfo(tz)
 
 
 def now_local(user: User) -> datetime:
-    return datetime.now(ZoneInfo(user.tz))
+    return datetime.now(_zi(user.tz))
 
 
 def today_local(user: User) -> date:
     return now_local(user).date()
 
 
+def day_num(d: date) -> int:
+    """Julian day number stored in tasks.day/sends.day; SQLite's date(day) turns it back into a date."""
+    return d.toordinal() + 1721425
+
+
+# Rendered /list text per (user_id, day). Any write to a user's tasks for a day
+# must call invalidate_list(); the epoch stops a /list that read before the
+# write from caching its now-stale result after the invalidation.
+_LIST_CACHE: OrderedDict[tuple[int, int], str] = OrderedDict()
+_LIST_CACHE_MAX = 10_000
+_list_epoch = 0
+
+
+def invalidate_list(user_id: int, day: int) -> None:
+    global _list_epoch
+    _list_epoch += 1
+    _LIST_CACHE.pop((user_id, day), None)
+
+
+_PR = {"low": "⬇️", "med": "⚪", "high": "⬆️"}
+_STATUS = {"done": "✅", "snoozed": "😴"}
+
+
 def fmt_task(row: sqlite3.Row) -> str:
-    pr = {"low": "⬇️", "med": "⚪", "high": "⬆️"}.get(row["priority"], "⚪")
-    due = f" @ {row['due_time']}" if row["due_time"] else ""
-    tags = f" {row['tags']}" if row["tags"] else ""
-    status = "✅" if row["status"] == "done" else ("😴" if row["status"] == "snoozed" else "⬜")
-    return f"{status} {pr} {row['title']}{due}{tags} (#{row['id']})"
+    pr = _PR.get(row["priority"], "⚪")
+    status = _STATUS.get(row["status"], "⬜")
+    due = row["due_time"]
+    tags = row["tags"]
+    return "{} {} {}{}{} (#{})".format(
+        status, pr, row["title"], " @ " + due if due else "", " " + tags if tags else "", row["id"]
+    )
 
 
 def quick_add_kb():
@@ -147,6 +276,7 @@ def quick_add_kb():
     return kb.as_markup()
 
 
+@functools.lru_cache(maxsize=1024)
 def task_action_kb(task_id: int):
     kb = InlineKeyboardBuilder()
     kb.button(text="✅ Done", callback_data=f"done|{task_id}")
@@ -155,45 +285,55 @@ def task_action_kb(task_id: int):
     kb.adjust(3)
     return kb.as_markup()
 
+
+# static, so build it once and reuse the same markup for every reply
+_QUICK_ADD_MARKUP = quick_add_kb()
+
+HELP_TEXT = (
+    "/add <task> [#tag ...] [!low|!med|!high] [@HH:MM] — add for **today**\n"
+    "/tomorrow <task> — add for **tomorrow**\n"
+    "/list — show today’s tasks\n"
+    "/done <id> — mark task done\n"
+    "/tz <Area/City> — set your timezone (e.g., /tz America/Los_Angeles)\n"
+    "/focus — start a 25/5 Pomodoro\n"
+    "/week — show last‑7‑days stats"
+)
+
 # --------------- COMMANDS --------------
 
 @dp.message(Command("start"))
 async def cmd_start(message: Message):
-    u = get_user(message.from_user.id)
+    u = await get_user(message.from_user.id)
     await message.reply(
         "👋 I’m your productive assistant!\n\n"
         "• I’ll ping you at 10/13/16/19/22 to plan **tomorrow**.\n"
         "• At 08:00 I’ll send your **Today** list and carry over unfinished items.\n"
         "• Use /add, /list, /done, /tomorrow, /tz, /focus, /week, /help.\n\n"
         f"Your timezone is **{u.tz}** (change via /tz <Area/City>).",
-        reply_markup=quick_add_kb(),
+        reply_markup=_QUICK_ADD_MARKUP,
     )
 
 
 @dp.message(Command("help"))
 async def cmd_help(message: Message):
-    await message.reply(
-        "/add <task> [#tag ...] [!low|!med|!high] [@HH:MM] — add for **today**\n"
-        "/tomorrow <task> — add for **tomorrow**\n"
-        "/list — show today’s tasks\n"
-        "/done <id> — mark task done\n"
-        "/tz <Area/City> — set your timezone (e.g., /tz America/Los_Angeles)\n"
-        "/focus — start a 25/5 Pomodoro\n"
-        "/week — show last‑7‑days stats",
-    )
+    await message.reply(HELP_TEXT)
+
+
+_TOK = re.compile(r"(?P<tag>#\S*)|(?P<prio>!\S*)|(?P<due>@\S*)|(?P<word>\S+)")
 
 
 def parse_task_args(args: str):
     title, tags, priority, due_time = [], [], "med", None
-    for tok in (args or "").split():
-        if tok.startswith("#"):
-            tags.append(tok)
-        elif tok.startswith("!"):
-            priority = tok[1:]
-        elif tok.startswith("@"):
-            due_time = tok[1:]
+    for m in _TOK.finditer(args or ""):
+        kind = m.lastgroup
+        if kind == "word":
+            title.append(m.group())
+        elif kind == "tag":
+            tags.append(m.group())
+        elif kind == "prio":
+            priority = m.group()[1:]
         else:
-            title.append(tok)
+            due_time = m.group()[1:]
     return " ".join(title).strip(), " ".join(tags), priority, due_time
 
 #-------------- COMMANDS --------------
@@ -201,7 +341,7 @@ def parse_task_args(args: str):
 @dp.message(Command("add"))
 async def cmd_add(message: Message, command: CommandObject):
     """Add a task for TODAY. Example: /add Finish module #study !high @18:00"""
-    u = get_user(message.from_user.id)
+    u = await get_user(message.from_user.id)
     if not command.args:
         await message.reply("Usage: /add Finish module #study !high @18:00")
         return
@@ -209,19 +349,16 @@ async def cmd_add(message: Message, command: CommandObject):
     if not title:
         await message.reply("Please include a task title. Example: /add Finish module")
         return
-    with closing(db()) as conn:
-        conn.execute(
-            "INSERT INTO tasks(user_id, title, day, due_time, priority, tags) VALUES (?,?,?,?,?,?)",
-            (u.user_id, title, today_local(u).isoformat(), due_time, priority, tags),
-        )
-        conn.commit()
+    day = day_num(today_local(u))
+    await _write(SQL_INSERT_TASK, (u.user_id, title, day, due_time, priority, tags))
+    invalidate_list(u.user_id, day)
     await message.reply(f"Added for today: **{title}**")
 
 
 @dp.message(Command("tomorrow"))
 async def cmd_tomorrow(message: Message, command: CommandObject):
     """Add a task for TOMORROW. Example: /tomorrow Gym @07:00"""
-    u = get_user(message.from_user.id)
+    u = await get_user(message.from_user.id)
     if not command.args:
         await message.reply("Usage: /tomorrow Gym @07:00")
         return
@@ -229,30 +366,30 @@ async def cmd_tomorrow(message: Message, command: CommandObject):
     if not title:
         await message.reply("Please include a task title. Example: /tomorrow Gym")
         return
-    with closing(db()) as conn:
-        conn.execute(
-            "INSERT INTO tasks(user_id, title, day, due_time, priority, tags) VALUES (?,?,?,?,?,?)",
-            (u.user_id, title, (today_local(u) + timedelta(days=1)).isoformat(), due_time, priority, tags),
-        )
-        conn.commit()
+    day = day_num(today_local(u)) + 1
+    await _write(SQL_INSERT_TASK, (u.user_id, title, day, due_time, priority, tags))
+    invalidate_list(u.user_id, day)
     await message.reply(f"Queued for tomorrow: **{title}**")
 
 
 @dp.message(Command("list"))
 async def cmd_list(message: Message):
-    u = get_user(message.from_user.id)
-    with closing(db()) as conn:
-        cur = conn.execute(
-            "SELECT * FROM tasks WHERE user_id=? AND day=? "
-            "ORDER BY CASE priority WHEN 'high' THEN 0 WHEN 'med' THEN 1 ELSE 2 END, "
-            "COALESCE(due_time,'99:99')",
-            (u.user_id, today_local(u).isoformat()),
-        )
-        rows = cur.fetchall()
-    if not rows:
-        await message.reply("No tasks for today. Use /add or the buttons below.", reply_markup=quick_add_kb())
+    u = await get_user(message.from_user.id)
+    key = (u.user_id, day_num(today_local(u)))
+    text = _LIST_CACHE.get(key)
+    if text is None:
+        epoch = _list_epoch
+        rows = await _exec(SQL_LIST_DAY, key)
+        text = "\n".join(fmt_task(r) for r in rows)
+        if epoch == _list_epoch:
+            _LIST_CACHE[key] = text
+            if len(_LIST_CACHE) > _LIST_CACHE_MAX:
+                _LIST_CACHE.popitem(last=False)
+    else:
+        _LIST_CACHE.move_to_end(key)
+    if not text:
+        await message.reply("No tasks for today. Use /add or the buttons below.", reply_markup=_QUICK_ADD_MARKUP)
         return
-    text = "\n".join(fmt_task(r) for r in rows)
     await message.reply(text)
 
 
@@ -262,9 +399,8 @@ async def cmd_done(message: Message, command: CommandObject):
         await message.reply("Usage: /done <task_id>")
         return
     task_id = int(command.args)
-    with closing(db()) as conn:
-        conn.execute("UPDATE tasks SET status='done' WHERE id=?", (task_id,))
-        conn.commit()
+    for r in await _exec(SQL_MARK_DONE, (task_id,)):
+        invalidate_list(r["user_id"], r["day"])
     await message.reply("Nice! Marked ✅")
 
 
@@ -278,35 +414,40 @@ async def cmd_tz(message: Message, command: CommandObject):
     except Exception:
         await message.reply("That timezone isn’t recognized. Try like America/New_York or Asia/Kathmandu")
         return
-    set_tz(message.from_user.id, command.args)
+    await set_tz(message.from_user.id, command.args)
     await message.reply(f"Timezone set to {command.args}. I’ll schedule reminders accordingly.")
 
 
+FOCUS_MINUTES = 25
+_focus_tasks: dict[int, asyncio.Task] = {}
+
+
+async def _focus_timer(user_id: int):
+    try:
+        await asyncio.sleep(FOCUS_MINUTES * 60)
+        await send_message_job(user_id, f"⏰ {FOCUS_MINUTES} minutes done! Take a 5-min break (/focus to start again).")
+    finally:
+        if _focus_tasks.get(user_id) is asyncio.current_task():
+            del _focus_tasks[user_id]
+
+
 @dp.message(Command("focus"))
 async def cmd_focus(message: Message):
-    await message.reply("⏱️ Focus started: 25 minutes. I’ll ping you when time’s up!")
-    u = get_user(message.from_user.id)
-    run_at = now_local(u) + timedelta(minutes=25)
-    scheduler.add_job(
-        send_message_job,
-        trigger='date',
-        run_date=run_at,
-        args=(u.user_id, "⏰ 25 minutes done! Take a 5-min break (/focus to start again)."),
-        id=f"focus-{u.user_id}-{int(run_at.timestamp())}",
-        replace_existing=False,
-    )
+    await message.reply(f"⏱️ Focus started: {FOCUS_MINUTES} minutes. I’ll ping you when time’s up!")
+    u = await get_user(message.from_user.id)
+    # restarting /focus replaces the running timer instead of stacking another
+    prev = _focus_tasks.pop(u.user_id, None)
+    if prev:
+        prev.cancel()
+    _focus_tasks[u.user_id] = asyncio.create_task(_focus_timer(u.user_id))
 
 
 @dp.message(Command("week"))
 async def cmd_week(message: Message):
-    u = get_user(message.from_user.id)
-    start = today_local(u) - timedelta(days=6)
-    with closing(db()) as conn:
-        cur = conn.execute(
-            "SELECT status, COUNT(*) c FROM tasks WHERE user_id=? AND day BETWEEN ? AND ? GROUP BY status",
-            (u.user_id, start.isoformat(), today_local(u).isoformat()),
-        )
-        stats = {row["status"]: row["c"] for row in cur.fetchall()}
+    u = await get_user(message.from_user.id)
+    today = day_num(today_local(u))
+    rows = await _exec(SQL_WEEK_STATS, (u.user_id, today - 6, today))
+    stats = {row["status"]: row["c"] for row in rows}
     done = stats.get("done", 0)
     total = sum(stats.values()) or 1
     rate = round(100 * done / total)
@@ -317,51 +458,55 @@ async def cmd_week(message: Message):
 
 # ----------- SCHEDULED JOBS -----------
 
+DIGEST_HOUR = 8
+PROMPT_HOURS = {10, 13, 16, 19, 22}
+ACTIVE_HOURS = {DIGEST_HOUR} | PROMPT_HOURS
+TICK_CONCURRENCY = 8
+
+# Telegram allows ~30 messages/s per bot; keep outgoing sends at least this far apart.
+SEND_INTERVAL = 1 / 25
+_send_lock = asyncio.Lock()
+_last_send = 0.0
+
+
+async def _throttled_send(user_id: int, text: str):
+    global _last_send
+    async with _send_lock:
+        loop = asyncio.get_running_loop()
+        wait = _last_send + SEND_INTERVAL - loop.time()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        _last_send = loop.time()
+    await bot.send_message(chat_id=user_id, text=text)
+
+
 async def send_message_job(user_id: int, text: str):
     try:
-        await bot.send_message(chat_id=user_id, text=text)
+        try:
+            await _throttled_send(user_id, text)
+        except TelegramRetryAfter as e:
+            # scheduled sends reserve their slot first, so retry once rather than lose the message
+            await asyncio.sleep(e.retry_after)
+            await _throttled_send(user_id, text)
     except Exception as e:
         print("send_message_job error:", e)
 
 
-def was_sent(user_id: int, kind: str, local_day: date, local_hour: int) -> bool:
-    with closing(db()) as conn:
-        cur = conn.execute(
-            "SELECT 1 FROM sends WHERE user_id=? AND kind=? AND day=? AND hour=?",
-            (user_id, kind, local_day.isoformat(), local_hour),
-        )
-        return cur.fetchone() is not None
-
-
-def mark_sent(user_id: int, kind: str, local_day: date, local_hour: int) -> None:
-    with closing(db()) as conn:
-        conn.execute(
-            "INSERT OR IGNORE INTO sends(user_id, kind, day, hour) VALUES (?,?,?,?)",
-            (user_id, kind, local_day.isoformat(), local_hour),
-        )
-        conn.commit()
+async def mark_sent(user_id: int, kind: str, local_day: date, local_hour: int) -> bool:
+    """Reserve a send slot; False means it was already taken and the job should skip."""
+    return await _write(SQL_INSERT_SENDS, (user_id, kind, day_num(local_day), local_hour)) == 1
 
 
 async def do_daily_digest(u: User, local_now: datetime):
-    if local_now.hour != 8 or was_sent(u.user_id, "digest", local_now.date(), 8):
+    if local_now.hour != DIGEST_HOUR or not await mark_sent(u.user_id, "digest", local_now.date(), DIGEST_HOUR):
         return
-    # show yesterday’s undone
-    yday = local_now.date() - timedelta(days=1)
-    with closing(db()) as conn:
-        cur = conn.execute(
-            "SELECT * FROM tasks WHERE user_id=? AND day=? AND status='open' ORDER BY id",
-            (u.user_id, yday.isoformat()),
-        )
-        y_open = cur.fetchall()
     # carry‑over
     await do_carry_over(u, local_now)
-    # today’s tasks
-    with closing(db()) as conn:
-        cur = conn.execute(
-            "SELECT * FROM tasks WHERE user_id=? AND day=? ORDER BY CASE priority WHEN 'high' THEN 0 WHEN 'med' THEN 1 ELSE 2 END, COALESCE(due_time,'99:99')",
-            (u.user_id, local_now.date().isoformat()),
-        )
-        rows = cur.fetchall()
+    # yesterday’s undone + today’s tasks in one query
+    today = day_num(local_now.date())
+    both = await _exec(SQL_LIST_TWO_DAYS, (u.user_id, today - 1, today))
+    y_open = [r for r in both if r["day"] == today - 1 and r["status"] == "open"]
+    rows = [r for r in both if r["day"] == today]
     sections = []
     if y_open:
         sections.append("⏮️ Yesterday (still open — copied to today):\n" + "\n".join(fmt_task(r) for r in y_open))
@@ -370,52 +515,65 @@ async def do_daily_digest(u: User, local_now: datetime):
     else:
         sections.append("☀️ Today:\n(no tasks) — Use /add or /tomorrow to plan.")
     await send_message_job(u.user_id, "\n\n".join(sections))
-    mark_sent(u.user_id, "digest", local_now.date(), 8)
 
 
 async def do_carry_over(u: User, local_now: datetime):
-    if was_sent(u.user_id, "carry", local_now.date(), 8):
+    if not await mark_sent(u.user_id, "carry", local_now.date(), DIGEST_HOUR):
         return
-    yday = local_now.date() - timedelta(days=1)
-    with closing(db()) as conn:
-        cur = conn.execute(
-            "SELECT id, title, due_time, priority, tags FROM tasks WHERE user_id=? AND day=? AND status='open'",
-            (u.user_id, yday.isoformat()),
-        )
-        open_rows = cur.fetchall()
-        for r in open_rows:
-            conn.execute(
-                "INSERT INTO tasks(user_id, title, day, due_time, priority, tags) VALUES (?,?,?,?,?,?)",
-                (u.user_id, r["title"], local_now.date().isoformat(), r["due_time"], r["priority"], r["tags"]),
-            )
-        conn.commit()
-    if open_rows:
-        await send_message_job(u.user_id, f"↪️ Carried over {len(open_rows)} unfinished task(s) from yesterday.")
-    mark_sent(u.user_id, "carry", local_now.date(), 8)
+    today = day_num(local_now.date())
+    carried = await _write(SQL_CARRY_OVER, (today, u.user_id, today - 1))
+    if carried:
+        invalidate_list(u.user_id, today)
+        await send_message_job(u.user_id, f"↪️ Carried over {carried} unfinished task(s) from yesterday.")
 
 
 async def do_tomorrow_prompt(u: User, local_now: datetime):
-    prompt_hours = {10, 13, 16, 19, 22}
     h = local_now.hour
-    if h in prompt_hours and not was_sent(u.user_id, "prompt", local_now.date(), h):
+    if h in PROMPT_HOURS and await mark_sent(u.user_id, "prompt", local_now.date(), h):
         await send_message_job(u.user_id, "📝 What would you like to add for tomorrow? Use /tomorrow <task>.")
-        mark_sent(u.user_id, "prompt", local_now.date(), h)
 
 
 async def hourly_tick():
-    with closing(db()) as conn:
-        cur = conn.execute("SELECT user_id, tz FROM users")
-        users = [User(r["user_id"], r["tz"]) for r in cur.fetchall()]
-    for u in users:
-        local_now = now_local(u).replace(minute=0, second=0, microsecond=0)
+    rows = await _exec(SQL_SELECT_USERS)
+    by_tz: dict[str, list[User]] = {}
+    for r in rows:
+        by_tz.setdefault(r["tz"], []).append(User(r["user_id"], r["tz"]))
+    # only timezones whose local hour has a digest or prompt need any DB work
+    due = []
+    for tz, users in by_tz.items():
+        local_now = datetime.now(_zi(tz)).replace(minute=0, second=0, microsecond=0)
+        if local_now.hour in ACTIVE_HOURS:
+            due.extend((u, local_now) for u in users)
+    if not due:
+        return
+    # caps how many users are processed at once; the send rate itself is
+    # limited in send_message_job
+    sem = asyncio.Semaphore(TICK_CONCURRENCY)
+    results = await asyncio.gather(
+        *(tick_user(sem, u, local_now) for u, local_now in due), return_exceptions=True
+    )
+    for (u, _), res in zip(due, results):
+        if isinstance(res, Exception):
+            print(f"hourly_tick error for user {u.user_id}:", res)
+
+
+async def tick_user(sem: asyncio.Semaphore, u: User, local_now: datetime):
+    async with sem:
         await do_daily_digest(u, local_now)
         await do_tomorrow_prompt(u, local_now)
 
+
+def nightly_cleanup():
+    # sends rows only matter for the current day; prune old ones and keep the WAL small
+    _write_sync(SQL_PRUNE_SENDS)
+    _query_sync("PRAGMA wal_checkpoint(TRUNCATE)")
+
 # ----------------- MAIN -----------------
 
 async def main():
     scheduler.start()
     scheduler.add_job(hourly_tick, CronTrigger(minute=0))
+    scheduler.add_job(nightly_cleanup, CronTrigger(hour=3, minute=5), executor="blocking")
     print("Bot is running…")
     await dp.start_polling(bot)
 